@@ -6,6 +6,7 @@ This is free and unencumbered software released into the public domain.
 
 Implementation of Bellman-Ford Algorithm for Lab 3.
 """
+from collections import deque
 
 
 class BellmanFord(object):
@@ -19,9 +20,8 @@ class BellmanFord(object):
         self.vertices = set()
         self.edges = {}
         if initial_edges is not None:
-            for u in initial_edges:
-                for v in initial_edges[u]:
-                    self.add_edge(u, v, initial_edges[u][v])
+            self.add_edges((u, v, w) for u in initial_edges
+                           for v, w in initial_edges[u].items())
 
     def add_edge(self, from_vertex, to_vertex, weight):
         """
@@ -41,6 +41,25 @@ class BellmanFord(object):
             self.edges[from_vertex] = {}
         self.edges[from_vertex][to_vertex] = weight
 
+    def add_edges(self, edges):
+        """
+        Add many edges (and possibly their vertices) to this graph in one
+        pass, as if by add_edge for each.
+
+        :param edges: iterable of (from_vertex, to_vertex, weight)
+        """
+        vertices, out_edges = self.vertices, self.edges
+        for from_vertex, to_vertex, weight in edges:
+            if from_vertex == to_vertex:
+                raise ValueError(
+                    '{} -> {}: {}'.format(from_vertex, to_vertex, weight))
+            vertices.add(from_vertex)
+            vertices.add(to_vertex)
+            to_edges = out_edges.get(from_vertex)
+            if to_edges is None:
+                to_edges = out_edges[from_vertex] = {}
+            to_edges[to_vertex] = weight
+
     def remove_edge(self, from_vertex, to_vertex):
         try:
             del self.edges[from_vertex][to_vertex]
@@ -84,29 +103,169 @@ class BellmanFord(object):
                             (u,v), in one such cycle
         """
         # initialize
+        inf = float('inf')
         distance, predecessor = {}, {}
         for v in self.vertices:
-            distance[v] = float('inf')
+            distance[v] = inf
             predecessor[v] = None
         distance[start_vertex] = 0
 
-        # repeated relaxation
+        # repeated relaxation, every so often checking whether the
+        # predecessors already loop (which can only be a negative cycle)
+        relaxations, check_every = 0, max(1, len(self.vertices) // 4)
         for i in range(len(self.vertices)):
-            for u in self.edges:
-                for v in self.edges[u]:
-                    w = self.edges[u][v]
-                    if distance[v] - (distance[u] + w) > tolerance:
+            relaxations_before_pass = relaxations
+            for u, out_edges in self.edges.items():
+                distance_u = distance[u]
+                if distance_u == inf:
+                    continue  # nothing to relax from an unreached vertex
+                for v, w in out_edges.items():
+                    if distance[v] - (distance_u + w) > tolerance:
                         if v == start_vertex:
                             return distance, predecessor, (u, v)
-                        distance[v] = distance[u] + w
+                        distance[v] = distance_u + w
                         predecessor[v] = u
+                        relaxations += 1
+                        if relaxations % check_every == 0:
+                            negative_cycle = self._predecessor_cycle_edge(predecessor, v)
+                            if negative_cycle is not None:
+                                return distance, predecessor, negative_cycle
+            if relaxations == relaxations_before_pass:
+                # a pass without any relaxation means the distances are final,
+                # so there can be no negative cycle either
+                return distance, predecessor, None
 
         # check for negative cycles
-        negative_cycle = None
-        for u in self.edges:
-            for v in self.edges[u]:
-                w = self.edges[u][v]
-                if distance[v] - (distance[u] + w) > tolerance:
+        for u, out_edges in self.edges.items():
+            distance_u = distance[u]
+            for v, w in out_edges.items():
+                if distance[v] - (distance_u + w) > tolerance:
                     return distance, predecessor, (u, v)
 
         return distance, predecessor, None
+
+    def shortest_paths_from(self, start_vertex, tolerance=0, distance=None,
+                            predecessor=None, changed_edges=()):
+        """
+        Same as shortest_paths, but using a queue of vertices to relax (SPFA)
+        that can be warm-started from the distance and predecessor of an
+        earlier run from start_vertex on this graph. Then only the vertices
+        affected by changed_edges, the edges (u,v) added, reweighted or removed
+        since that run, are relaxed. The earlier run must not have reported a
+        negative cycle; with no earlier run, all distances start from scratch.
+
+        >>> g = BellmanFord({'a': {'b': 1, 'c':5}, 'b': {'c': 2, 'a': 10}, 'c': {'a': 14, 'd': -3}, 'e': {'a': 100}})
+        >>> dist, prev, neg_edge = g.shortest_paths_from('a')
+        >>> [(v, dist[v]) for v in sorted(dist)]
+        [('a', 0), ('b', 1), ('c', 3), ('d', 0), ('e', inf)]
+        >>> g.add_edge('b', 'c', 7)  # heavier edge on the shortest path to 'c'
+        >>> dist, prev, neg_edge = g.shortest_paths_from('a', 0, dist, prev, [('b', 'c')])
+        >>> [(v, dist[v]) for v in sorted(dist)]
+        [('a', 0), ('b', 1), ('c', 5), ('d', 2), ('e', inf)]
+        >>> [(v, prev[v]) for v in sorted(prev)]
+        [('a', None), ('b', 'a'), ('c', 'a'), ('d', 'c'), ('e', None)]
+        >>> g.add_edge('a', 'e', -200)
+        >>> dist, prev, neg_edge = g.shortest_paths_from('a', 0, dist, prev, [('a', 'e')])
+        >>> neg_edge
+        ('e', 'a')
+
+        :param start_vertex: start of all paths
+        :param tolerance: only if a path is more than tolerance better will
+                          it be relaxed
+        :param distance: distance from an earlier run, or None
+        :param predecessor: predecessor from an earlier run, or None
+        :param changed_edges: edges (u,v) changed since the earlier run
+        :return: (distance, predecessor, negative_cycle) as for shortest_paths
+        """
+        inf = float('inf')
+        if distance is None:
+            distance, predecessor = {}, {}
+            for v in self.vertices:
+                distance[v] = inf
+                predecessor[v] = None
+            distance[start_vertex] = 0
+            predecessor[start_vertex] = None
+            queue = deque([start_vertex])
+        else:
+            distance, predecessor = dict(distance), dict(predecessor)
+            for v in self.vertices:
+                if v not in distance:
+                    distance[v] = inf
+                    predecessor[v] = None
+
+            # a shortest path through an edge that got heavier (or was removed)
+            # may no longer exist, so forget everything reached through it
+            invalid = []
+            for u, v in changed_edges:
+                if predecessor[v] == u:
+                    w = self.edges.get(u, {}).get(v)
+                    if w is None or distance[u] + w > distance[v]:
+                        invalid.append(v)
+            if invalid:
+                children = {}
+                for v, u in predecessor.items():
+                    if u is not None:
+                        children.setdefault(u, []).append(v)
+                while invalid:
+                    v = invalid.pop()
+                    if distance[v] != inf:
+                        distance[v] = inf
+                        predecessor[v] = None
+                        invalid.extend(children.get(v, ()))
+
+            # relax from the tails of changed edges and from any vertex that
+            # can reach one whose distance was just forgotten
+            start = {u for u, v in changed_edges if distance[u] != inf}
+            for u in self.edges:
+                if distance[u] != inf and u not in start:
+                    for v in self.edges[u]:
+                        if distance[v] == inf:
+                            start.add(u)
+                            break
+            queue = deque(start)
+
+        # repeated relaxation of the out edges of each queued vertex, every so
+        # often checking whether the predecessors already loop
+        queued = set(queue)
+        enqueue_count = {}
+        relaxations, check_every = 0, max(1, len(self.vertices) // 4)
+        while queue:
+            u = queue.popleft()
+            queued.discard(u)
+            for v, w in self.edges.get(u, {}).items():
+                if distance[v] - (distance[u] + w) > tolerance:
+                    if v == start_vertex:
+                        return distance, predecessor, (u, v)
+                    distance[v] = distance[u] + w
+                    predecessor[v] = u
+                    relaxations += 1
+                    if relaxations % check_every == 0:
+                        negative_cycle = self._predecessor_cycle_edge(predecessor, v)
+                        if negative_cycle is not None:
+                            return distance, predecessor, negative_cycle
+                    if v not in queued:
+                        # queued more than |V| times only if on or behind a negative cycle
+                        enqueue_count[v] = enqueue_count.get(v, 0) + 1
+                        if enqueue_count[v] > len(self.vertices):
+                            negative_cycle = self._predecessor_cycle_edge(predecessor, v)
+                            if negative_cycle is not None:
+                                return distance, predecessor, negative_cycle
+                            return self.shortest_paths(start_vertex, tolerance)
+                        queue.append(v)
+                        queued.add(v)
+
+        return distance, predecessor, None
+
+    @staticmethod
+    def _predecessor_cycle_edge(predecessor, vertex):
+        """
+        Walk back from vertex through the predecessors. If the walk loops, the
+        loop is a negative cycle; return one of its edges (u,v), else None.
+        """
+        seen = set()
+        while vertex is not None and vertex not in seen:
+            seen.add(vertex)
+            vertex = predecessor[vertex]
+        if vertex is None:
+            return None
+        return predecessor[vertex], vertex
@@ -1,26 +1,40 @@
+import heapq
+import logging
 import socket
-from datetime import datetime, timedelta
+import selectors
 import fxp_bytes_subscriber
 import bellman_ford
-import math
-import threading
-import queue
 import time
 
+log = logging.getLogger(__name__)
+
 class Subscriber:
     """
     A subscriber client that connects to a ForexProvider publisher service.
     Monitors prices for arbitrage opportunities using the  Bellman-Ford algorithm.
+    Receiving, parsing, graph updates and arbitrage checks all run on one thread
+    driven by a selector, so no state is shared between threads.
     
     Attributes:
         server_address: Tuple of (host, port) for the ForexProvider server
         socket: UDP socket for receiving price updates
+        selector: Selector waiting for the socket to become readable
+        receive_buffer: Preallocated buffer every packet is received into
+        receive_view: Memoryview over receive_buffer, sliced to each packet without copying
         quotes_dict: Dictionary storing current forex prices and timestamps
+        quote_expiry: Heap of (timestamp, currency_pair) for quotes added to quotes_dict,
+            oldest first; entries superseded by a newer quote are skipped when popped
         current_path: Currently identified arbitrage path, if any
-        quotes_graph: Graph representation of forex pairs for arbitrage detection
-        dict_lock: Thread lock for synchronizing access to shared data
-        quotes_queue: Queue for processing incoming quote updates
-        running: Boolean flag to control thread execution
+        quotes_graph: Graph representation of forex pairs for arbitrage detection, updated
+            in place from changed_pairs
+        applied_quotes: Log price of each pair currently applied to quotes_graph
+        edge_owners: Pair whose quote set each directed edge of quotes_graph; a pair and
+            its reverse, e.g. ('EUR', 'USD') and ('USD', 'EUR'), share the same two edges
+        previous_paths: (distance, predecessor) of the last arbitrage-free Bellman-Ford run,
+            used to warm-start the next one
+        changed_pairs: Pairs added, updated or removed since the graph was last updated
+        last_purge: time.monotonic() of the last remove_stale_quotes run
+        running: Boolean flag to control the event loop
     """
     def __init__(self, server_address):
         """
@@ -32,11 +46,20 @@ class Subscriber:
         self.server_address = server_address
         self.socket = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
         self.socket.bind(("127.0.0.1", 0))
+        self.socket.setblocking(False)
+        self.selector = selectors.DefaultSelector()
+        self.selector.register(self.socket, selectors.EVENT_READ)
+        self.receive_buffer = bytearray(4096)
+        self.receive_view = memoryview(self.receive_buffer)
         self.quotes_dict = {}
+        self.quote_expiry = []
         self.current_path = None
         self.quotes_graph = bellman_ford.BellmanFord()
-        self.dict_lock = threading.Lock()
-        self.quotes_queue = queue.Queue()
+        self.applied_quotes = {}
+        self.edge_owners = {}
+        self.previous_paths = None
+        self.changed_pairs = set()
+        self.last_purge = time.monotonic()
         self.running = True
         
     def subscribe(self):
@@ -55,86 +78,113 @@ class Subscriber:
         Update the internal quotes dictionary with new price information.
         
         Args:
-            new_quotes_dict: Dictionary of new forex quotes {currency_pair: (price, timestamp)}
-            
-        Returns:
-            bool: True if any quotes were updated, False otherwise
+            new_quotes_dict: Dictionary of new forex quotes
+                {currency_pair: (price, timestamp, log_price)}, with timestamps in seconds
+                since the epoch
         """
-        updated = False
-        with self.dict_lock:
-            for iso_pair, (price, timestamp) in new_quotes_dict.items():
-                # Add new currency pairs to our tracking
-                if iso_pair not in self.quotes_dict:
-                    print(f"Adding new quotes for: {iso_pair}")
-                    self.quotes_dict[iso_pair] = (price, timestamp)
-                    updated = True
-                # Update existing pairs only if we have newer data
-                elif self.quotes_dict[iso_pair][1] < timestamp:
-                    self.quotes_dict[iso_pair] = (price, timestamp)
-                    updated = True
-                else:
-                    print(f"Outdated quote for: {iso_pair} received")
-            
-            # If we made any updates, notify the graph update thread
-            if updated:
-                self.quotes_queue.put(dict(self.quotes_dict))
+        for iso_pair, quote in new_quotes_dict.items():
+            # Add new currency pairs to our tracking
+            if iso_pair not in self.quotes_dict:
+                if log.isEnabledFor(logging.DEBUG):
+                    log.debug("Adding new quotes for: %s", iso_pair)
+                self.quotes_dict[iso_pair] = quote
+                heapq.heappush(self.quote_expiry, (quote[1], iso_pair))
+                self.changed_pairs.add(iso_pair)
+            # Update existing pairs only if we have newer data
+            elif self.quotes_dict[iso_pair][1] < quote[1]:
+                self.quotes_dict[iso_pair] = quote
+                heapq.heappush(self.quote_expiry, (quote[1], iso_pair))
+                self.changed_pairs.add(iso_pair)
+            else:
+                if log.isEnabledFor(logging.DEBUG):
+                    log.debug("Outdated quote for: %s received", iso_pair)
 
     def remove_stale_quotes(self):
         """
         Remove quotes older than 1.5 seconds from the quotes dictionary.
-        Updates the quotes queue if any quotes are removed.
+        Only the expired entries at the front of quote_expiry are visited.
         """
-        current_time = datetime.utcnow()
-        with self.dict_lock:
-            # Collect keys to remove first to avoid modifying dict during iteration
-            stale_pairs = []
-            
-            for iso_pair, (price, timestamp) in self.quotes_dict.items():
-                age = (current_time - timestamp).total_seconds()
-                if age > 1.5:  # Quotes older than 1.5 seconds are considered stale
-                    print(f"Removing quote {iso_pair}: {price} aged {age} seconds")
-                    stale_pairs.append(iso_pair)
-            
-            # Remove the stale quotes
-            for iso_pair in stale_pairs:
-                del self.quotes_dict[iso_pair]
-            
-            # Notify graph update thread if quotes were removed
-            if stale_pairs:
-                self.quotes_queue.put(dict(self.quotes_dict))
+        current_time = time.time()
+        # Quotes older than 1.5 seconds are considered stale
+        while self.quote_expiry and current_time - self.quote_expiry[0][0] > 1.5:
+            timestamp, iso_pair = heapq.heappop(self.quote_expiry)
+            quote = self.quotes_dict.get(iso_pair)
+            # Skip entries for quotes that have since been replaced or removed
+            if quote is None or quote[1] != timestamp:
+                continue
+            if log.isEnabledFor(logging.DEBUG):
+                log.debug("Removing quote %s: %s aged %s seconds", iso_pair, quote[0], current_time - timestamp)
+            del self.quotes_dict[iso_pair]
+            self.changed_pairs.add(iso_pair)
 
     def update_graph(self):
         """
-        Continuously update the forex graph with new quotes and check for arbitrage opportunities.
-        Runs in a separate thread to process the quotes queue.
+        Update the forex graph with the quotes in changed_pairs and check for arbitrage
+        opportunities. Rather than rebuilding the graph, only the edges of those pairs
+        are updated or removed.
         """
-        while self.running:
-            try:
-                quotes = self.quotes_queue.get(timeout=0.1)
-                
-                new_graph = bellman_ford.BellmanFord()
-                
-                for iso_pair, (price, timestamp) in quotes.items():
-                    # Double-check quote freshness before using it
-                    age = (datetime.utcnow() - timestamp).total_seconds()
-                    if age <= 1.5:  
-                        # Negative log for base currency -> quote currency
-                        # Positive log for quote currency -> base currency
-                        log_price = math.log10(price)
-                        new_graph.add_edge(iso_pair[0], iso_pair[1], -log_price)
-                        new_graph.add_edge(iso_pair[1], iso_pair[0], log_price)
-                
-                # Update the graph reference atomically
-                with self.dict_lock:
-                    self.quotes_graph = new_graph
-                
-                self.identify_arbitrage()
-                
-            except queue.Empty:
-                continue
-            except Exception as e:
-                print(f"Error in graph update thread: {e}")
+        # Take the pending changes first so a pair that fails to apply is not retried forever
+        changed_pairs, self.changed_pairs = self.changed_pairs, set()
+        new_edges, new_quotes, changed_edges = [], [], []
+        current_time = time.time()
+        
+        for iso_pair in changed_pairs:
+            quote = self.quotes_dict.get(iso_pair)
+            # Double-check quote freshness before using it
+            if quote is not None and current_time - quote[1] <= 1.5:
+                if iso_pair[0] == iso_pair[1]:
+                    continue  # a currency quoted against itself is not a graph edge
+                log_price = quote[2]
+                if self.applied_quotes.get(iso_pair) != log_price:
+                    # Negative log for base currency -> quote currency
+                    # Positive log for quote currency -> base currency
+                    new_edges.append((iso_pair[0], iso_pair[1], -log_price))
+                    new_edges.append((iso_pair[1], iso_pair[0], log_price))
+                    new_quotes.append((iso_pair, log_price))
+            elif iso_pair in self.applied_quotes:
+                # Quote was removed or has gone stale, so drop its edges
+                del self.applied_quotes[iso_pair]
+                changed_edges.extend(self.remove_pair_edges(iso_pair))
+        
+        # Only record quotes as applied once their edges are actually in the graph
+        self.quotes_graph.add_edges(new_edges)
+        for iso_pair, log_price in new_quotes:
+            self.applied_quotes[iso_pair] = log_price
+            self.edge_owners[iso_pair] = self.edge_owners[iso_pair[::-1]] = iso_pair
+            changed_edges.append(iso_pair)
+            changed_edges.append(iso_pair[::-1])
+        
+        if changed_edges:
+            self.identify_arbitrage(changed_edges)
+
+    def remove_pair_edges(self, iso_pair):
+        """
+        Take the edges set by a pair's quote out of the graph. Edges last set by the
+        reverse pair are left alone; if the reverse pair is still applied, the edges
+        it shares with iso_pair fall back to its price instead of being removed.
+        
+        Args:
+            iso_pair: Currency pair no longer in applied_quotes
+        
+        Returns:
+            list: Graph edges (from, to) that were changed
+        """
+        reverse_pair = iso_pair[::-1]
+        changed_edges = []
+        for edge in (iso_pair, reverse_pair):
+            if self.edge_owners.get(edge) != iso_pair:
                 continue
+            if reverse_pair in self.applied_quotes:
+                # Negative log for base currency -> quote currency of the reverse pair
+                log_price = self.applied_quotes[reverse_pair]
+                weight = -log_price if edge == reverse_pair else log_price
+                self.quotes_graph.add_edge(edge[0], edge[1], weight)
+                self.edge_owners[edge] = reverse_pair
+            else:
+                self.quotes_graph.edges.get(edge[0], {}).pop(edge[1], None)
+                del self.edge_owners[edge]
+            changed_edges.append(edge)
+        return changed_edges
 
     def find_negative_cycle_path(self, predecessor, neg_edge):
         """
@@ -152,19 +202,21 @@ class Subscriber:
             return None
         
         u, v = neg_edge
-        # Initialize cycle with the negative edge endpoints
+        # Initialize cycle with the negative edge endpoints, tracking each
+        # vertex's position for constant-time membership checks
         cycle = [v, u]
+        position = {v: 0, u: 1}
         current = predecessor[u]
         
         # Walk backwards through predecessors until we complete the cycle
         # This reconstructs the full negative cycle from the Bellman-Ford results
-        while current not in cycle:
+        while current not in position:
+            position[current] = len(cycle)
             cycle.append(current)
             current = predecessor[current]
             
         # Extract just the cycle portion (remove path leading to cycle)
-        cycle_start = cycle.index(current)
-        cycle = cycle[cycle_start:]
+        cycle = cycle[position[current]:]
         # Add starting vertex to end to complete the cycle
         cycle.append(cycle[0])
         
@@ -173,80 +225,93 @@ class Subscriber:
         
         return cycle
 
-    def identify_arbitrage(self):
+    def identify_arbitrage(self, changed_edges):
         """
         Check for arbitrage opportunities using the Bellman-Ford algorithm.
         If found, prints the arbitrage path and calculated profit from a
         hypothetical 100 unit trade.
+        
+        Args:
+            changed_edges: Graph edges (from, to) changed since the previous check
         """
-        # Run Bellman-Ford starting from USD
-        shortest_path = self.quotes_graph.shortest_paths('USD', 0.000000001)
-        path = self.find_negative_cycle_path(shortest_path[1], shortest_path[2])
+        # Run Bellman-Ford starting from USD, warm-started from the previous run when possible
+        distance, predecessor = self.previous_paths or (None, None)
+        distance, predecessor, neg_edge = self.quotes_graph.shortest_paths_from(
+            'USD', 0.000000001, distance, predecessor, changed_edges)
+        # Distances are meaningless once a negative cycle is found, so start over next time
+        self.previous_paths = (distance, predecessor) if neg_edge is None else None
+        path = self.find_negative_cycle_path(predecessor, neg_edge)
 
-        with self.dict_lock:        
-            # Only process if we found a new arbitrage path
-            if path and path != self.current_path:
-                self.current_path = path
-                curr_money = 100  # Start with 100 units of base currency
-                print("ARBITRAGE OPPORTUNITY:")
+        # Only process if we found a new arbitrage path
+        if not path or path == self.current_path:
+            return
+        self.current_path = path
 
-                # Walk through the path calculating conversions
-                for i in range(len(path) - 1):  
-                    curr_pair = (path[i], path[i + 1])
+        # Look up every exchange rate on the path first, handling both quote directions
+        rates = []
+        for curr_pair in zip(path, path[1:]):
+            if curr_pair in self.quotes_dict:
+                rates.append(self.quotes_dict[curr_pair][0])
+            elif curr_pair[::-1] in self.quotes_dict:
+                # If we have the inverse rate, flip it
+                rates.append(1 / self.quotes_dict[curr_pair[::-1]][0])
+            else:
+                log.warning("Could not find price for %s", curr_pair)
+                return
 
-                    # Look up the exchange rate, handling both quote directions
-                    if curr_pair in self.quotes_dict:
-                        curr_rate = self.quotes_dict[curr_pair][0]
-                    elif curr_pair[::-1] in self.quotes_dict: 
-                        # If we have the inverse rate, flip it
-                        curr_rate = self.quotes_dict[curr_pair[::-1]][0]
-                        curr_rate = 1/curr_rate
-                    else:
-                        print(f"Could not find price for {curr_pair}")
-                    
-                    # Calculate running profit through the arbitrage cycle
-                    curr_money *= curr_rate
-                    print(f"\t{curr_pair[0]} -> {curr_pair[1]}: by {curr_rate} for {curr_money}")
+        # Calculate running profit through the arbitrage cycle, reporting it in a single write
+        curr_money = 100  # Start with 100 units of base currency
+        report = ["ARBITRAGE OPPORTUNITY:"]
+        for i, curr_rate in enumerate(rates):
+            curr_money *= curr_rate
+            report.append(f"\t{path[i]} -> {path[i + 1]}: by {curr_rate} for {curr_money}")
+        print("\n".join(report))
 
     def receive_updates(self):
         """
-        Continuously listen for and process quote updates from the ForexProvider.
-        Runs in a separate thread to handle incoming UDP packets.
+        Drain every UDP packet of quote updates waiting on the socket and merge
+        them into the quotes dictionary, so a burst of packets costs a single
+        graph update and arbitrage check. Packets are received into the reusable
+        receive_buffer and parsed in place.
         """
-        while self.running:
+        while True:
             try:
-                data, _ = self.socket.recvfrom(4096)
-                quotes_binary = fxp_bytes_subscriber.split_quotes(data)
-                new_quotes_dict = fxp_bytes_subscriber.parse_quotes(quotes_binary)
-                self.update_quotes_dict(new_quotes_dict)
-                self.remove_stale_quotes()
-            except Exception as e:
-                print(f"Error receiving updates: {e}")
+                nbytes, _ = self.socket.recvfrom_into(self.receive_buffer)
+            except BlockingIOError:
+                break
+            new_quotes_dict = fxp_bytes_subscriber.parse_quotes(self.receive_view[:nbytes])
+            self.update_quotes_dict(new_quotes_dict)
 
-    def start(self):
+    def run(self):
         """
-        Start the subscriber service by launching the graph update and
-        quote receiving threads.
+        Run the subscriber's event loop on the calling thread until stopped.
+        Each wake-up receives all waiting packets and updates the graph. Stale
+        quotes are removed every 0.5 seconds rather than on every wake-up; the
+        select timeout is bounded by the next purge so this happens even when
+        no packets arrive.
         """
-        # Start the graph update thread
-        self.graph_thread = threading.Thread(target=self.update_graph)
-        self.graph_thread.daemon = True
-        self.graph_thread.start()
-
-        # Start the update receiving thread
-        self.receive_thread = threading.Thread(target=self.receive_updates)
-        self.receive_thread.daemon = True
-        self.receive_thread.start()
+        while self.running:
+            try:
+                timeout = max(0, self.last_purge + 0.5 - time.monotonic())
+                for key, mask in self.selector.select(timeout=timeout):
+                    self.receive_updates()
+                now = time.monotonic()
+                if now - self.last_purge >= 0.5:
+                    self.remove_stale_quotes()
+                    self.last_purge = now
+                self.update_graph()
+            except Exception as e:
+                print(f"Error processing updates: {e}")
 
     def stop(self):
         """
-        Stop the subscriber service by shutting down all threads and
+        Stop the subscriber service by ending the event loop and
         closing the socket connection.
         """
         self.running = False
+        self.selector.close()
         self.socket.close()
-        self.graph_thread.join(timeout=1)
-        self.receive_thread.join(timeout=1)
+        self.receive_view.release()
 
 def main():
     """
@@ -258,11 +323,7 @@ def main():
     
     try:
         subscriber.subscribe()
-        subscriber.start()
-        
-        # Keep the main thread running
-        while True:
-            time.sleep(1)
+        subscriber.run()
             
     except KeyboardInterrupt:
         print("\nSubscriber shutting down...")
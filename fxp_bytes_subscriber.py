@@ -4,10 +4,15 @@ All functions handle binary data conversion for the Forex Provider protocol.
 """
 
 import ipaddress
+import math
+import struct
+import sys
 from array import array
 from datetime import datetime
 
 MICROS_PER_SECOND = 1_000_000
+PRICE_FORMAT = struct.Struct('<f')  # little-endian IEEE 754 float
+TIMESTAMP_FORMAT = struct.Struct('>Q')  # big-endian unsigned 64-bit microseconds
 
 def serialize_address(address) -> bytes:
     """
@@ -44,11 +49,9 @@ def deserialize_price(byte_data: bytes) -> float:
     Returns:
         float: Deserialized price value
     """
-    a = array('f')
-    a.frombytes(byte_data)
-    return a[0]
+    return PRICE_FORMAT.unpack(byte_data)[0]
 
-def deserialize_utcdatetime(byte_data: bytes) -> int:
+def deserialize_utcdatetime(byte_data: bytes) -> float:
     """
     Convert a byte stream from a Forex Provider message back into seconds since epoch.
     Expects an 8-byte stream representing microseconds since Unix epoch in big-endian format.
@@ -61,68 +64,56 @@ def deserialize_utcdatetime(byte_data: bytes) -> int:
         byte_data (bytes): 8-byte sequence representing microseconds since epoch in big-endian
     
     Returns:
-        int: Seconds since Unix epoch (January 1, 1970)
+        float: Seconds since Unix epoch (January 1, 1970)
     """
-    a = array('Q')
-    a.frombytes(byte_data)
-    a.byteswap()
-    micros = a[0]
-    return micros / MICROS_PER_SECOND
+    return TIMESTAMP_FORMAT.unpack(byte_data)[0] / MICROS_PER_SECOND
 
-def split_quotes(binary_string: bytes) -> list:
+# pair (6 ASCII bytes), little-endian float price, raw big-endian timestamp, padding
+QUOTE_RECORD = struct.Struct('<6sf8s14x')
+QUOTE_SIZE = QUOTE_RECORD.size
+
+class PairCache(dict):
     """
-    Split a binary string containing multiple forex quotes into fixed-size chunks.
-    
-    Args:
-        binary_string (bytes): Raw binary data containing multiple forex quotes
+    Maps the 6 raw ISO pair bytes of a quote to its (base, quote) currency tuple,
+    decoding each pair only the first time it is seen. Currency codes are interned,
+    so every occurrence of a code is the same string object and the graph's
+    vertex-keyed dicts compare them by identity.
     
-    Returns:
-        list: List of 32-byte chunks, each containing a single forex quote
-        
-    Note:
-        Each quote consists of:
-        - 6 bytes: ISO currency pair (ASCII)
-        - 4 bytes: Price (float)
-        - 8 bytes: Timestamp (microseconds since epoch)
-        - 14 bytes: Reserved/padding
+    Example:
+    >>> PairCache()[b'GBPUSD']
+    ('GBP', 'USD')
     """
-    quotes_size = 32
-    quotes_count = len(binary_string) // quotes_size
-    
-    quotes_list = []
-    for i in range(quotes_count):
-        start = i * quotes_size
-        end = start + quotes_size
-        chunk = binary_string[start:end]
-        quotes_list.append(chunk)
-        
-    if len(binary_string) % quotes_size:
-        remaining = binary_string[quotes_count * quotes_size:]
-        quotes_list.append(remaining)
-        
-    return quotes_list
+    def __missing__(self, raw_pair):
+        iso_pair = self[raw_pair] = (sys.intern(raw_pair[0:3].decode('ascii')),
+                                     sys.intern(raw_pair[3:6].decode('ascii')))
+        return iso_pair
+
+ISO_PAIRS = PairCache()
 
-def parse_quotes(binary_quotes_list: list) -> dict:
+def parse_quotes(data) -> dict:
     """
-    Parse a list of binary forex quotes into a dictionary of currency pairs with prices and timestamps.
+    Parse a Forex Provider message into a dictionary of currency pairs with prices, timestamps
+    and base-10 log prices (the graph edge weights), computed once per received quote.
+    All records are decoded by a single precompiled struct in one pass over a memoryview
+    of the message.
     
     Args:
-        binary_quotes_list (list): List of 32-byte chunks containing forex quotes
+        data (bytes-like): Raw binary data containing multiple 32-byte forex quotes,
+            e.g. bytes or a memoryview over a receive buffer
         
     Returns:
-        dict: Dictionary mapping currency pairs to tuples of (price, timestamp)
-              Example: {'EURUSD': (1.2345, 1634567890.123456)}
+        dict: Dictionary mapping currency pairs to tuples of (price, timestamp, log_price)
+              Example: {('EUR', 'USD'): (1.2345, 1634567890.123456, 0.0914812)}
               
     Note:
-        Each binary quote should contain:
-        - Currency pair (bytes 0-5)
-        - Price (bytes 6-9)
-        - Timestamp (bytes 10-17)
+        Each quote consists of:
+        - 6 bytes: ISO currency pair (ASCII)
+        - 4 bytes: Price (float)
+        - 8 bytes: Timestamp (microseconds since epoch)
+        - 14 bytes: Reserved/padding
+        Any trailing partial record is ignored.
     """
-    quotes_dict = {}
-    for quote in binary_quotes_list:
-        iso_pair = (quote[0:3].decode('ascii'), quote[3:6].decode('ascii'))
-        price = deserialize_price(quote[6:10])
-        timestamp = deserialize_utcdatetime(quote[10:18])
-        quotes_dict[iso_pair] = (price, timestamp)
-    return quotes_dict
\ No newline at end of file
+    view = memoryview(data)
+    end = len(view) // QUOTE_SIZE * QUOTE_SIZE
+    return {ISO_PAIRS[pair]: (price, int.from_bytes(micros, 'big') / MICROS_PER_SECOND, math.log10(price))
+            for pair, price, micros in QUOTE_RECORD.iter_unpack(view[:end])}